@@ -0,0 +1,86 @@
+"""Gemeinsame, browserfreie Helfer für stepstone_scraper.py und den Scrapy-Spider."""
+import re
+from typing import Optional
+
+# Einmal beim Import kompiliert/gebaut statt pro Aufruf
+_UMLAUT_TRANS = str.maketrans({"ä": "ae", "ö": "oe", "ü": "ue", "ß": "ss"})
+_WS_RE = re.compile(r"\s+")
+# Rechtsform am Ende ("ACME GmbH", "Foo AG", "Bar GmbH & Co. KG") für den Firmen-Schlüssel ignorieren
+_LEGAL_SUFFIX_RE = re.compile(r'(?:\s+(?:gmbh|mbh|ag|se|kg|ug|e\.?\s?v|ltd|inc|co)\.?|\s*&)+$', re.IGNORECASE)
+_UID_RE = re.compile(r'companyUid=([0-9a-fA-F\-]{16,})')
+# Eine Alternation statt drei Durchläufe über (ggf. MB-großes) HTML
+_UID_HTML_RE = re.compile(
+    r'(?:companyUid=|"companyUid"\s*:\s*"|data-company-uid=[\'"])([0-9a-fA-F\-]{16,})',
+    re.IGNORECASE,
+)
+_TOTAL_RES = [re.compile(p, re.IGNORECASE) for p in (
+    r'"totalResultCount"\s*:\s*(\d+)', r'"totalResults"\s*:\s*(\d+)',
+    r'"resultCount"\s*:\s*(\d+)', r'"totalJobs"\s*:\s*(\d+)',
+)]
+_RESULTS_SPAN_RE = re.compile(r'at-facet-header-total-results[^>]*>([^<]+)')
+# Badge auf Firmenprofilen: ein Element, dessen Text nur "12 offene Stellen" ist –
+# Fließtext wie "Über 100.000 offene Stellen" (Seitenwerbung) passt bewusst nicht
+_OPEN_JOBS_RE = re.compile(r'>\s*(\d[\d\.]*)\s+offene\s+(?:Stellen|Jobs)\s*<', re.IGNORECASE)
+_TOTAL_NEAR_RE = re.compile(r'(Ergebnisse|Treffer)[^0-9]{0,40}(\d[\d\.]*)', re.IGNORECASE)
+
+def slug_city(text: str) -> str:
+    s = text.strip().lower().translate(_UMLAUT_TRANS)  # ein Durchlauf statt 4× replace
+    return _WS_RE.sub("-", s)
+
+def build_search_url(keyword: str, city: str, radius: int, page_num: int) -> str:
+    return f"https://www.stepstone.de/jobs/{keyword}/in-{slug_city(city)}?radius={radius}&page={page_num}&searchOrigin=Resultlist_top-search"
+
+class _NonDigitTable(dict):
+    """translate()-Tabelle: alles außer 0-9 wird entfernt (auch Nicht-ASCII wie NBSP)."""
+    def __missing__(self, cp):
+        v = cp if 48 <= cp <= 57 else None
+        self[cp] = v
+        return v
+
+_NONDIGIT = _NonDigitTable()
+
+def only_digits(text: str) -> str:
+    return text.translate(_NONDIGIT)
+
+def company_key(company: str) -> str:
+    """Kanonischer Firmenname für Dedupe/Cache: casefold, Leerraum normalisiert,
+    Rechtsform am Ende entfernt. Fällt auf den normalisierten Namen zurück,
+    falls sonst nichts übrig bliebe."""
+    name = _WS_RE.sub(" ", company.strip().casefold())
+    return _LEGAL_SUFFIX_RE.sub("", name) or name
+
+def uid_from_href(href: str) -> Optional[str]:
+    m = _UID_RE.search(href)
+    return m.group(1) if m else None
+
+def extract_company_uid_from_html(html: str) -> Optional[str]:
+    m = _UID_HTML_RE.search(html)
+    return m.group(1) if m else None
+
+def parse_total_from_html(html: str) -> int:
+    # primär: bekannte JSON-Felder
+    for pat in _TOTAL_RES:
+        m = pat.search(html)
+        if m:
+            return int(m.group(1))
+    # fallback: Zahl nahe "Ergebnisse"/"Treffer"
+    m = _TOTAL_NEAR_RE.search(html)
+    return int(only_digits(m.group(2)) or 0) if m else 0
+
+def parse_count_from_html(html: str) -> Optional[int]:
+    """Zähler aus serverseitig gerendertem HTML (ohne Browser).
+    None = kein Zähler gefunden (→ Aufrufer fällt auf Playwright zurück)."""
+    m = _RESULTS_SPAN_RE.search(html)
+    if m:
+        digits = only_digits(m.group(1))
+        if digits:
+            return int(digits)
+    for pat in _TOTAL_RES:
+        m = pat.search(html)
+        if m:
+            return int(m.group(1))
+    # Nur ein eindeutiger Badge zählt; mehrere Treffer (Teaser, Listen) → Browser-Fallback
+    badges = _OPEN_JOBS_RE.findall(html)
+    if len(badges) == 1:
+        return int(only_digits(badges[0]))
+    return None
@@ -1,7 +1,8 @@
-import os, re, json
+import os, json
 import scrapy
 from urllib.parse import urljoin, urlparse, parse_qs
 from scrapy_playwright.page import PageMethod
+from ..helpers import build_search_url, extract_company_uid_from_html, parse_total_from_html, uid_from_href
 from ..items import LeadItem
 
 # ---- Konfiguration (ENV > Defaults) ----
@@ -18,37 +19,6 @@ SEARCH_PARAMS = [
     # ... ergänze deine Liste (oder über ENV laden)
 ]
 
-def slug_city(text: str) -> str:
-    repl = (("ä","ae"),("ö","oe"),("ü","ue"),("ß","ss"))
-    s = text.strip().lower()
-    for a,b in repl: s = s.replace(a,b)
-    return re.sub(r"\s+", "-", s)
-
-def build_search_url(keyword: str, city: str, radius: int, page_num: int) -> str:
-    return f"https://www.stepstone.de/jobs/{keyword}/in-{slug_city(city)}?radius={radius}&page={page_num}&searchOrigin=Resultlist_top-search"
-
-def extract_company_uid_from_html(html: str):
-    pats = [
-        r'companyUid=([0-9a-fA-F\-]{16,})',
-        r'"companyUid"\s*:\s*"([0-9a-fA-F\-]{16,})"',
-        r"data-company-uid=['\"]([0-9a-fA-F\-]{16,})['\"]",
-    ]
-    for pat in pats:
-        m = re.search(pat, html, flags=re.IGNORECASE)
-        if m:
-            return m.group(1)
-
-def parse_total_from_html(html: str) -> int:
-    # primär: bekannte JSON-Felder
-    for pat in [r'"totalResultCount"\s*:\s*(\d+)', r'"totalResults"\s*:\s*(\d+)',
-                r'"resultCount"\s*:\s*(\d+)', r'"totalJobs"\s*:\s*(\d+)']:
-        m = re.search(pat, html, flags=re.IGNORECASE)
-        if m:
-            return int(m.group(1))
-    # fallback: Zahl nahe "Ergebnisse"/"Treffer"
-    m = re.search(r'(Ergebnisse|Treffer)[^0-9]{0,40}(\d[\d\.]*)', html, flags=re.IGNORECASE)
-    return int(re.sub(r'\D', '', m.group(2))) if m else 0
-
 class StepstoneSpider(scrapy.Spider):
     name = "stepstone"
     custom_settings = {
@@ -126,9 +96,7 @@ class StepstoneSpider(scrapy.Spider):
             uid_link = card.css("[data-at='job-item-company-name'] a[href*='companyUid=']::attr(href)").get()
             current_uid = None
             if uid_link:
-                m = re.search(r'companyUid=([0-9a-fA-F\-]{16,})', uid_link)
-                if m:
-                    current_uid = m.group(1)
+                current_uid = uid_from_href(uid_link)
 
             # Wenn keine UID vorhanden, kurze Detailseite öffnen, um UID zu finden
             if not current_uid:
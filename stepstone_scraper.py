@@ -1,16 +1,36 @@
 #!/usr/bin/env python3
 import asyncio
+import atexit
+import contextlib
 import csv
+import gzip
+import json
 import logging
 import os
-import re
+import random
+import shelve
+import signal
 import sys
+import tempfile
 import time
+import weakref
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import List, Dict, Set, Optional
+from typing import Callable, List, Dict, Set, Optional, Tuple, MutableMapping
 
 from playwright.async_api import async_playwright, TimeoutError as PlaywrightTimeoutError
-from playwright_stealth import stealth_async
+from playwright_stealth import StealthConfig
+
+try:
+    import orjson
+    _dumps = orjson.dumps
+except ImportError:  # optional – Fallback auf die Standardbibliothek
+    def _dumps(obj) -> bytes:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+from helpers import (build_search_url, company_key, extract_company_uid_from_html, only_digits,
+                     parse_count_from_html, parse_total_from_html, uid_from_href)
 
 # =============================
 # Output/Env (Render-freundlich)
@@ -29,9 +49,14 @@ PROXY_PASS   = os.getenv("PROXY_PASS")
 LOG_FILE = os.path.join(OUT_DIR, "stepstone_scraper.log")
 logger = logging.getLogger("StepstoneScraper")
 logger.setLevel(logging.INFO)
-fmt = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
-ch = logging.StreamHandler(); ch.setFormatter(fmt); logger.addHandler(ch)
-fh = logging.FileHandler(LOG_FILE); fh.setFormatter(fmt); logger.addHandler(fh)
+
+def setup_logging():
+    # Handler erst beim Start, nicht beim Import (Wrapper importieren dieses Modul)
+    if logger.handlers:
+        return
+    fmt = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+    ch = logging.StreamHandler(); ch.setFormatter(fmt); logger.addHandler(ch)
+    fh = logging.FileHandler(LOG_FILE); fh.setFormatter(fmt); logger.addHandler(fh)
 
 # =============================
 # Config (wie Overnight)
@@ -55,38 +80,121 @@ PAGE_LIMIT = 20
 MIN_JOBS   = 10
 MAX_JOBS   = 50
 ACCESS_DENIED_LIMIT = 10
+WORKERS    = int(os.getenv("WORKERS", "3"))  # parallele Suchen (je eigener Context)
+NAV_RATE   = float(os.getenv("NAV_RATE", "8"))  # max. Navigationen/Sekunde über alle Worker
+CARD_CONCURRENCY = int(os.getenv("CARD_CONCURRENCY", "5"))  # gleichz. bearbeitete Karten gesamt
+AUX_PAGES  = int(os.getenv("AUX_PAGES", "2"))  # vorgewärmte Hilfsseiten je Context
+AUX_LIMIT  = int(os.getenv("AUX_LIMIT", str(WORKERS * AUX_PAGES)))  # gleichz. Zähl-/Detail-Lookups gesamt
+PAGE_RECYCLE_USES = int(os.getenv("PAGE_RECYCLE_USES", "50"))  # Hilfsseite danach neu erzeugen
+
+def build_search_jobs(params) -> List[Tuple[str, str, int, List[str]]]:
+    """(keyword, city, radius, [URL je Seite]) – Slug/URLs nur einmal statt pro Seite bauen."""
+    return [(kw, city, radius, [build_search_url(kw, city, radius, p) for p in range(1, PAGE_LIMIT + 1)])
+            for kw, city, radius in params]
+
+SEARCH_JOBS = build_search_jobs(SEARCH_PARAMS)
 
-PROGRESS_FILE = os.path.join(OUT_DIR, "progress.txt")
+PROGRESS_FILE = os.path.join(OUT_DIR, "progress.json")
+LEGACY_PROGRESS_FILE = os.path.join(OUT_DIR, "progress.txt")  # nur noch gelesen
+PROGRESS_MIN_INTERVAL = 1.0  # Sekunden zwischen zwei Progress-Schreibvorgängen
+STATE_FILE    = os.path.join(OUT_DIR, "state.json")  # storage_state mit akzeptiertem Consent
+JOB_COUNT_DB  = os.path.join(OUT_DIR, "jobcount.db")  # Firma → Jobanzahl über Läufe hinweg
+JOB_COUNT_TTL = 24 * 3600
+NEGATIVE_COUNT_TTL = 3600  # 0-Ergebnisse kürzer cachen (Zähler evtl. nur nicht erkannt)
+CACHE_SYNC_EVERY = int(os.getenv("CACHE_SYNC_EVERY", "25"))  # shelve alle N neuen Einträge auf Platte
 ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-RAW_CSV   = os.path.join(OUT_DIR, f"stepstone_raw_leads_{ts}.csv")
+RAW_JSONL = os.path.join(OUT_DIR, f"stepstone_raw_leads_{ts}.jsonl.gz")
 FINAL_CSV = os.path.join(OUT_DIR, f"stepstone_leads_{ts}.csv")
 
 # =============================
 # Helpers
 # =============================
-def slug_city(text: str) -> str:
-    repl = (("ä","ae"),("ö","oe"),("ü","ue"),("ß","ss"))
-    s = text.strip().lower()
-    for a,b in repl: s = s.replace(a,b)
-    return re.sub(r"\s+", "-", s)
+class RateLimiter:
+    """Token-Bucket: erlaubt Bursts bis max_rate, begrenzt aber die Dauerrate
+    global auf max_rate pro time_period (statt fester Sleeps je Navigation)."""
+    def __init__(self, max_rate: float, time_period: float = 1.0):
+        self.max_rate = max_rate
+        self.time_period = time_period
+        self._tokens = float(max_rate)
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.max_rate,
+                                   self._tokens + (now - self._last) * self.max_rate / self.time_period)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) * self.time_period / self.max_rate)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
 
-def build_search_url(keyword: str, city: str, radius: int, page_num: int) -> str:
-    return f"https://www.stepstone.de/jobs/{keyword}/in-{slug_city(city)}?radius={radius}&page={page_num}&searchOrigin=Resultlist_top-search"
+NAV_LIMITER = RateLimiter(NAV_RATE)
+
+async def goto(page, url: str, **kwargs):
+    """page.goto hinter dem globalen Navigations-Limiter."""
+    async with NAV_LIMITER:
+        return await page.goto(url, **kwargs)
+
+# Ein Selektor für alle bekannten Consent-Buttons → nur eine kurze Wartezeit pro Seite
+_ACCEPT_SEL = (
+    "#ccmgt_explicit_accept, "
+    "button[aria-label='Alle akzeptieren'], button[aria-label='Alles akzeptieren'], "
+    "button:has-text('Alle akzeptieren'), button:has-text('Alles akzeptieren'), "
+    "button:has-text('Accept all')"
+)
+# Contexts, in denen der Banner schon bestätigt wurde (Consent ist cookie-basiert)
+_COOKIES_ACCEPTED = weakref.WeakSet()
 
 async def accept_all_cookies(page):
+    if page.context in _COOKIES_ACCEPTED:
+        return
     try:
-        await page.click('#ccmgt_explicit_accept', timeout=5000)
+        btn = await page.wait_for_selector(_ACCEPT_SEL, timeout=1000)
+        if btn:
+            await btn.click(timeout=500)
+            _COOKIES_ACCEPTED.add(page.context)
+            if not os.path.exists(STATE_FILE):
+                # Consent-Cookies sichern → neue Contexts sehen den Banner gar nicht erst
+                await page.context.storage_state(path=STATE_FILE)
     except Exception:
         pass
 
+DENIED_STATUS = frozenset((401, 403, 429, 503))
+# Nur die ersten 4 KB sichtbaren Texts im Browser prüfen – kein content()-Transfer
+_DENIED_JS = "b => /access denied|permission to access/i.test(b.innerText.slice(0, 4096))"
+
+def is_denied_response(resp) -> bool:
+    """Sperre direkt am HTTP-Status erkennen (auch Cloudflare-503) – ohne Body."""
+    return resp is not None and resp.status in DENIED_STATUS
+
 async def is_access_denied(page) -> bool:
+    """Fallback-Scan des Bodys, falls der Status unauffällig war."""
     try:
-        txt = (await page.content()).lower()
-        return "access denied" in txt or "permission to access" in txt
+        return await page.locator("body").evaluate(_DENIED_JS)
     except Exception:
         return False
 
-async def get_job_count(page) -> int:
+async def page_html(page, resp=None) -> str:
+    """HTML der Seite – bevorzugt der Body der Navigations-Response (schon übertragen,
+    keine DOM-Serialisierung), sonst page.content()."""
+    if resp is not None:
+        try:
+            return await resp.text()
+        except Exception:
+            pass
+    return await page.content()
+
+async def get_job_count(page, resp=None) -> int:
     """
     Robust: probiert mehrere Selektoren und fällt auf JSON im HTML zurück.
     Liefert 0 nur, wenn wirklich nichts gefunden wird.
@@ -107,282 +215,901 @@ async def get_job_count(page) -> int:
                 if await loc.count():
                     text = await loc.first.text_content()
                     if text:
-                        digits = re.sub(r"\D", "", text)
+                        digits = only_digits(text)
                         if digits:
                             return int(digits)
             except Exception:
                 pass
         await asyncio.sleep(0.25)
 
-    # Fallback: JSON im HTML
+    # Fallback: JSON/Heuristik im HTML
     try:
-        html = await page.content()
-        patterns = [
-            r'"totalResultCount"\s*:\s*(\d+)',
-            r'"totalResults"\s*:\s*(\d+)',
-            r'"resultCount"\s*:\s*(\d+)',
-            r'"totalJobs"\s*:\s*(\d+)',
-        ]
-        for pat in patterns:
-            m = re.search(pat, html, flags=re.IGNORECASE)
-            if m:
-                return int(m.group(1))
-        # Heuristik: Zahl nahe "Ergebnisse"/"Treffer"
-        m = re.search(r'(Ergebnisse|Treffer)[^0-9]{0,40}(\d[\d\.]*)', html, flags=re.IGNORECASE)
-        if m:
-            return int(re.sub(r'\D', '', m.group(2)))
+        return parse_total_from_html(await page_html(page, resp))
     except Exception:
-        pass
-    return 0
-
-def ensure_raw_header():
-    if not os.path.exists(RAW_CSV):
-        with open(RAW_CSV, 'w', newline='', encoding='utf-8') as f:
-            writer = csv.DictWriter(f, fieldnames=['keyword','location','title','company','jobs','profile'])
-            writer.writeheader()
-
-def append_raw_row(row: Dict):
-    with open(RAW_CSV, 'a', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=['keyword','location','title','company','jobs','profile'])
-        writer.writerow(row)
-
-def extract_company_uid_from_html(html: str) -> Optional[str]:
-    pats = [
-        r'companyUid=([0-9a-fA-F\-]{16,})',
-        r'"companyUid"\s*:\s*"([0-9a-fA-F\-]{16,})"',
-        r"data-company-uid=['\"]([0-9a-fA-F\-]{16,})['\"]",
-    ]
-    for pat in pats:
-        m = re.search(pat, html, flags=re.IGNORECASE)
-        if m:
-            return m.group(1)
-    return None
+        return 0
 
-async def count_on_profile(context, url: str) -> int:
-    """Zählt auf einer Firmenprofil-/CMP-Seite (Overnight-Standard)."""
-    p = await context.new_page()
+LEAD_FIELDS = ['keyword','location','title','company','jobs','profile']
+
+LEAD_BATCH_SIZE = 32
+LEAD_BATCH_WAIT = 0.2  # Sekunden
+LEAD_FLUSH_INTERVAL = 5.0  # Sekunden; spätestens dann landet der Puffer auf der Platte (lead_writer_task)
+
+class LeadSink(ABC):
+    """Ein Handle für den ganzen Lauf statt open/close pro Lead.
+    Schreibt in den (64 KiB) Puffer; flush nur alle LEAD_BATCH_SIZE Zeilen
+    oder nach LEAD_FLUSH_INTERVAL statt nach jeder Zeile."""
+    def __init__(self, path: str, mode: str, **kw):
+        self.path = path
+        self.new_file = not os.path.exists(path)
+        self._fh = self._open(path, mode, **kw)
+        self._unflushed = 0
+        self._last_flush = 0.0
+
+    def _open(self, path: str, mode: str, **kw):
+        return open(path, mode, buffering=1 << 16, **kw)
+
+    @abstractmethod
+    def _write(self, rows: List[Dict]):
+        ...
+
+    @property
+    def dirty(self) -> bool:
+        return self._unflushed > 0
+
+    def flush(self):
+        if self._unflushed:
+            self._fh.flush()
+        self._unflushed, self._last_flush = 0, time.monotonic()
+
+    def writerows(self, rows: List[Dict]):
+        self._write(rows)
+        self._unflushed += len(rows)
+        if self._unflushed >= LEAD_BATCH_SIZE or time.monotonic() - self._last_flush >= LEAD_FLUSH_INTERVAL:
+            self.flush()
+
+    def close(self):
+        self._fh.close()
+
+class CsvSink(LeadSink):
+    def __init__(self, path: str):
+        super().__init__(path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._fh, fieldnames=LEAD_FIELDS)
+        if self.new_file:
+            self._writer.writeheader()
+
+    def _write(self, rows: List[Dict]):
+        self._writer.writerows(rows)
+
+class JsonlSink(LeadSink):
+    """Rohdaten als gzip-JSONL: Serialisierung in C (orjson) statt csv-Formatierung
+    in Python; Level 1 schrumpft die redundanten Zeilen bei kaum CPU-Kosten.
+    Anhängen erzeugt weitere gzip-Member – gzip/zcat lesen das als eine Datei."""
+    def __init__(self, path: str):
+        super().__init__(path, 'ab')
+
+    def _open(self, path: str, mode: str, **kw):
+        return gzip.open(path, mode, compresslevel=1)
+
+    def _write(self, rows: List[Dict]):
+        self._fh.write(b"".join(_dumps(r) + b"\n" for r in rows))
+
+# RAW (JSONL) + FINAL (CSV) werden parallel fortgeschrieben. seen_companies dedupliziert schon beim
+# Einfügen, daher entfällt der frühere Dedupe-Durchlauf am Ende komplett.
+_LEAD_SINKS: List[LeadSink] = []
+
+def open_lead_sinks():
+    if _LEAD_SINKS:
+        return
+    _LEAD_SINKS.extend((JsonlSink(RAW_JSONL), CsvSink(FINAL_CSV)))
+    atexit.register(close_lead_sinks)
+
+def append_lead_rows(rows: List[Dict]):
+    for sink in _LEAD_SINKS:
+        sink.writerows(rows)
+
+def lead_sinks_dirty() -> bool:
+    return any(sink.dirty for sink in _LEAD_SINKS)
+
+def flush_lead_sinks():
+    for sink in _LEAD_SINKS:
+        sink.flush()
+
+def close_lead_sinks():
+    while _LEAD_SINKS:
+        _LEAD_SINKS.pop().close()
+
+def drain_lead_queue(queue: asyncio.Queue, held: List[Dict] = ()) -> List[Dict]:
+    """Schreibt bereits entnommene (held) und alle noch wartenden Leads synchron
+    und flusht – für Abbruch und Shutdown, wenn kein Writer-Task mehr läuft.
+    Liefert die geschriebenen Zeilen."""
+    rows = list(held)
+    taken = 0
+    while True:
+        try:
+            item = queue.get_nowait()
+        except asyncio.QueueEmpty:
+            break
+        taken += 1
+        if item is not None:
+            rows.append(item)
     try:
-        await stealth_async(p)
-        await p.goto(url, wait_until="domcontentloaded", timeout=30000)
-        await accept_all_cookies(p)
-        return await get_job_count(p)
+        if rows:
+            append_lead_rows(rows)
+        flush_lead_sinks()
     finally:
-        await p.close()
+        for _ in range(len(held) + taken):
+            queue.task_done()
+    return rows
 
-async def count_on_companyuid(context, uid: str) -> int:
-    """Zählt auf /jobs/?companyUid=... – wartet kurz auf bekannte Zähler und nutzt robuste Zählroutine."""
-    list_url = f"https://www.stepstone.de/jobs/?companyUid={uid}"
-    p = await context.new_page()
+async def lead_writer_task(queue: asyncio.Queue, on_saved: Callable[[List[Dict]], None]):
+    """Sammelt Leads (max. LEAD_BATCH_SIZE oder LEAD_BATCH_WAIT) und schreibt sie
+    gebündelt – die Worker blockieren so nie auf Platten-I/O. Ein None in der
+    Queue beendet den Task, nachdem alles davor geschrieben ist. on_saved bekommt
+    Zeilen erst, wenn sie geflusht auf der Platte liegen (→ Checkpoint)."""
+    loop = asyncio.get_running_loop()
+    pending: List[Dict] = []  # geschrieben, aber noch im Puffer
+
+    def saved():
+        if pending and not lead_sinks_dirty():
+            on_saved(pending[:])
+            pending.clear()
+
+    stop = False
+    while not stop:
+        batch: List[Dict] = []
+        try:
+            if lead_sinks_dirty():
+                # Ungeflushte Zeilen im Puffer: bei Leerlauf spätestens nach LEAD_FLUSH_INTERVAL schreiben
+                try:
+                    item = await asyncio.wait_for(queue.get(), LEAD_FLUSH_INTERVAL)
+                except asyncio.TimeoutError:
+                    await asyncio.to_thread(flush_lead_sinks)
+                    saved()
+                    continue
+            else:
+                item = await queue.get()
+            deadline = loop.time() + LEAD_BATCH_WAIT
+            while True:
+                if item is None:
+                    queue.task_done()
+                    stop = True
+                    break
+                batch.append(item)
+                timeout = deadline - loop.time()
+                if len(batch) >= LEAD_BATCH_SIZE or timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+        except asyncio.CancelledError:
+            # Bereits entnommene Zeilen nicht verlieren
+            pending.extend(drain_lead_queue(queue, batch))
+            saved()
+            raise
+        if not batch:
+            continue
+        try:
+            # flush() kann auf /data (Netzlaufwerk) dauern → nicht im Event-Loop
+            await asyncio.to_thread(append_lead_rows, batch)
+            pending.extend(batch)
+            saved()
+        except Exception as e:
+            logger.error(f"❌ Lead-Schreiben fehlgeschlagen: {e}")
+        finally:
+            for _ in batch:
+                queue.task_done()
+    await asyncio.to_thread(flush_lead_sinks)
+    saved()
+
+# companyUid direkt im Browser suchen (Links, data-Attribut, JSON-Inseln) –
+# über CDP kommt nur der kurze UID-String zurück, nie das ganze Dokument.
+_UID_JS = r"""() => {
+    const hrefRe = /companyUid=([0-9a-fA-F\-]{16,})/i;
+    for (const a of document.querySelectorAll("a[href*='companyUid=']")) {
+        const m = a.href.match(hrefRe);
+        if (m) return m[1];
+    }
+    const el = document.querySelector("[data-company-uid]");
+    if (el && /^[0-9a-fA-F\-]{16,}$/.test(el.getAttribute("data-company-uid"))) {
+        return el.getAttribute("data-company-uid");
+    }
+    const jsonRe = /"companyUid"\s*:\s*"([0-9a-fA-F\-]{16,})"/i;
+    for (const s of document.querySelectorAll(
+            "script#__NEXT_DATA__, script[type='application/ld+json'], script[type='application/json']")) {
+        const m = s.textContent.match(jsonRe);
+        if (m) return m[1];
+    }
+    return null;
+}"""
+
+async def uid_from_detail_page(page) -> Optional[str]:
+    return await page.evaluate(_UID_JS)
+
+# Bilder/Fonts/CSS und Tracker blockiert Chromium selbst (CDP) – kein Python-Callback
+# pro Request wie bei page.route, und der Ressourcen-Cache bleibt aktiv.
+BLOCKED_URLS = [
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico",
+    "*.woff*", "*.ttf", "*.otf", "*.css", "*.mp4", "*.webm",
+    "*googletagmanager*", "*google-analytics*", "*doubleclick*",
+    "*facebook*", "*hotjar*", "*segment.io*",
+    "*adnxs*", "*criteo*", "*scorecardresearch*", "*optimizely*",
+    "*cloudflareinsights*", "*cookiebot*", "*trustarc*", "*usercentrics*",
+]
+
+async def block_resources(page):
     try:
-        await stealth_async(p)
-        await p.goto(list_url, wait_until="domcontentloaded", timeout=20000)
-        await accept_all_cookies(p)
-        # Optional auf Counter warten (wenn er dynamisch auftaucht)
+        client = await page.context.new_cdp_session(page)
+        await client.send("Network.enable")
+        await client.send("Network.setBlockedURLs", {"urls": BLOCKED_URLS})
+    except Exception as e:
+        logger.debug(f"Ressourcen-Blocking nicht aktiv: {e}")
+
+class PagePool:
+    """Vorab erzeugte Hilfsseiten eines Contexts (Stealth erben sie vom Context).
+    Statt new_page()+close() pro Zählung: ausleihen, nutzen,
+    per about:blank leeren und zurückgeben. Nach PAGE_RECYCLE_USES Einsätzen
+    wird eine Seite ersetzt, damit der Renderer-Speicher nicht stetig wächst."""
+    def __init__(self, context, size: int, recycle_uses: int = PAGE_RECYCLE_USES):
+        self.context = context
+        self.size = size
+        self.recycle_uses = recycle_uses
+        self._free: asyncio.Queue = asyncio.Queue()  # (page, uses)
+        # Meldet gesperrte Hilfs-Requests (401/403/429/503) an den Lauf; setzt search_worker
+        self.on_denied: Callable[[str], None] = lambda url: None
+
+    async def _new_page(self):
+        p = await self.context.new_page()
+        await block_resources(p)
+        return p
+
+    async def fill(self):
+        for _ in range(self.size):
+            self._free.put_nowait((await self._new_page(), 0))
+
+    async def _replace(self, p):
         try:
-            await p.wait_for_selector(
-                'span.at-facet-header-total-results, [data-at="facet-header-total-results"], [data-testid="search-total-results"], [data-at="total-results"]',
-                timeout=6000
-            )
+            await p.close()
         except Exception:
             pass
-        return await get_job_count(p)
-    finally:
-        await p.close()
+        try:
+            return await self._new_page()
+        except Exception as e:
+            # Slot bleibt erhalten (None) und wird beim nächsten Ausleihen neu versucht
+            logger.warning(f"⚠️ Pool-Seite konnte nicht ersetzt werden: {e}")
+            return None
+
+    @contextlib.asynccontextmanager
+    async def page(self):
+        p, uses = await self._free.get()
+        if p is None:
+            try:
+                p = await self._new_page()
+            except BaseException:
+                self._free.put_nowait((None, 0))
+                raise
+        try:
+            yield p
+        finally:
+            uses += 1
+            try:
+                if uses >= self.recycle_uses:
+                    p, uses = await self._replace(p), 0
+                else:
+                    try:
+                        await p.goto("about:blank")
+                    except Exception:
+                        # Seite hängt/ist kaputt → durch eine frische ersetzen
+                        p, uses = await self._replace(p), 0
+            finally:
+                # Slot immer zurückgeben (auch bei Abbruch) – sonst hängt der nächste get() ewig
+                self._free.put_nowait((p, uses))
+
+_COUNTER_SEL = ('span.at-facet-header-total-results, [data-at="facet-header-total-results"], '
+                '[data-testid="search-total-results"], [data-at="total-results"]')
+_SEARCH_READY_SEL = "article[data-at='job-item'], span.at-facet-header-total-results"
+
+async def count_loaded_page(p, resp=None, wait_ms: int = 6000) -> int:
+    """Auf den Zähler warten; der Consent-Banner verdeckt ihn nicht, also nur
+    dann wegklicken, wenn der Zähler nicht (rechtzeitig) erscheint."""
+    try:
+        await p.wait_for_selector(_COUNTER_SEL, timeout=wait_ms)
+    except Exception:
+        await accept_all_cookies(p)
+    return await get_job_count(p, resp)
+
+# Obergrenze für gleichzeitige Hilfs-Lookups über alle Worker/Contexts hinweg
+# (Proxy-Quota, Chromium-Speicher) – unabhängig von der Kartenparallelität.
+_CARD_SEM = asyncio.Semaphore(CARD_CONCURRENCY)
+_COUNT_SEM = asyncio.Semaphore(AUX_LIMIT)
+_DETAIL_SEM = asyncio.Semaphore(AUX_LIMIT)
+
+async def count_via_http(pool: PagePool, url: str) -> Optional[int]:
+    """Zähler per schlichtem GET über context.request (Cookies/Proxy des Contexts,
+    kein Rendering). None bei Sperre/Fehler/ohne Zähler → Playwright-Fallback."""
+    try:
+        # Gleiches globales Budget wie die Navigationen
+        async with NAV_LIMITER:
+            resp = await pool.context.request.get(url, timeout=15000)
+    except Exception as e:
+        logger.debug(f"HTTP-Zählung fehlgeschlagen ({url}): {e}")
+        return None
+    if resp.status in DENIED_STATUS:
+        pool.on_denied(url)
+        return None
+    if not resp.ok:
+        return None
+    return parse_count_from_html(await resp.text())
+
+async def count_on_url(pool: PagePool, url: str, timeout: int) -> int:
+    async with _COUNT_SEM:
+        count = await count_via_http(pool, url)
+        if count is not None:
+            return count
+        async with pool.page() as p:
+            # Nur zählen: ab "commit" übernimmt wait_for_selector in count_loaded_page,
+            # statt erst auf das komplette Parsen zu warten
+            resp = await goto(p, url, wait_until="commit", timeout=timeout)
+            return await count_loaded_page(p, resp)
+
+async def count_on_profile(pool: PagePool, url: str) -> int:
+    """Zählt auf einer Firmenprofil-/CMP-Seite (Overnight-Standard)."""
+    return await count_on_url(pool, url, timeout=30000)
+
+async def count_on_companyuid(pool: PagePool, uid: str) -> int:
+    """Zählt auf /jobs/?companyUid=... – wartet kurz auf bekannte Zähler und nutzt robuste Zählroutine."""
+    return await count_on_url(pool, f"https://www.stepstone.de/jobs/?companyUid={uid}", timeout=8000)
+
+async def uid_via_http(pool: PagePool, job_url: str) -> Optional[str]:
+    """companyUid aus dem serverseitig gerenderten Detail-HTML per context.request –
+    ohne Renderer/CDP. None bei Sperre/Fehler/ohne Treffer → Playwright-Fallback."""
+    try:
+        async with NAV_LIMITER:
+            resp = await pool.context.request.get(job_url, timeout=15000)
+    except Exception as e:
+        logger.debug(f"HTTP-UID fehlgeschlagen ({job_url}): {e}")
+        return None
+    if resp.status in DENIED_STATUS:
+        pool.on_denied(job_url)
+        return None
+    if not resp.ok:
+        return None
+    return extract_company_uid_from_html(await resp.text())
+
+async def uid_from_job_url(pool: PagePool, job_url: str) -> Optional[str]:
+    """companyUid einer Jobdetailseite: erst per HTTP, sonst Seite kurz öffnen."""
+    async with _DETAIL_SEM:
+        uid = await uid_via_http(pool, job_url)
+        if uid:
+            return uid
+        async with pool.page() as d:
+            await goto(d, job_url, wait_until="domcontentloaded", timeout=20000)
+            await accept_all_cookies(d)
+            return await uid_from_detail_page(d)
+
+# Titel/Firma (wie Overnight, mit sanftem Fallback) und alle Links je Karte –
+# ausgewertet im Browser, zurück kommt eine Liste schlichter Dicts.
+_CARDS_JS = """els => els.map(e => {
+    const q = s => e.querySelector(s);
+    const t = q("[data-testid='job-item-title'] div.res-ewgtgq") || q("[data-testid='job-item-title'] div");
+    const c = q("span[data-at='job-item-company-name'] span.res-du9bhi") || q("span[data-at='job-item-company-name'] span");
+    const logo = q("a[data-at='company-logo']");
+    const name = q("[data-at='job-item-company-name'] a[href*='companyUid=']");
+    const job = q("[data-testid='job-item-title'] a");
+    return {
+        title: t ? t.innerText.trim() : "",
+        company: c ? c.innerText.trim() : "",
+        profile_url: (logo && logo.href) || null,
+        uid_href: (name && name.href) || null,
+        job_url: (job && job.href) || null,
+    };
+})"""
+
+async def count_company_jobs(pool: PagePool, card: Dict) -> Tuple[int, str]:
+    """Zählt die offenen Jobs einer Karte: Firmenprofil, sonst companyUid-Liste.
+    Liefert (job_count, profile_url_für_den_Lead). Endet die Zählung ohne Treffer
+    nur wegen Fehlern (Timeout, Sperre), wird der Fehler weitergereicht statt 0
+    zu melden – sonst landete er als echte 0 im Cache."""
+    # Primär: Firmenprofil (Logo-Link) → zählen
+    profile_url = card["profile_url"]
+
+    job_count = 0
+    error: Optional[Exception] = None
+    if profile_url:
+        try:
+            job_count = await count_on_profile(pool, profile_url)
+        except Exception as e:
+            logger.debug(f"Profilzählung fehlgeschlagen: {e}")
+            error = e
+
+    # Fallback: companyUid (aus Karte oder Detailseite) → /jobs/?companyUid=...
+    current_uid: Optional[str] = None
+    if job_count == 0:
+        # a) direkt aus Karte (Namenslink mit companyUid)
+        if card["uid_href"]:
+            current_uid = uid_from_href(card["uid_href"])
+
+        # b) sonst Jobdetailseite kurz öffnen und UID parsen
+        if not current_uid and card["job_url"]:
+            try:
+                current_uid = await uid_from_job_url(pool, card["job_url"])
+            except Exception as e:
+                logger.debug(f"UID-Ermittlung fehlgeschlagen: {e}")
+                error = error or e
+
+        if current_uid:
+            job_count = await count_on_companyuid(pool, current_uid)
+            if job_count > 0:
+                logger.info(f"🔗 Fallback via companyUid ok ({current_uid})")
+
+    if job_count == 0 and error is not None:
+        raise error
+
+    profile = profile_url or (f"https://www.stepstone.de/jobs/?companyUid={current_uid}" if current_uid else "")
+    return job_count, profile
 
 # =============================
 # Main
 # =============================
-async def scrape():
-    raw_leads: List[Dict] = []
-    seen_companies: Set[str] = set()
-    access_denied_count = 0
-    total_hits = 0
+@dataclass
+class ScrapeState:
+    """Von allen Workern geteilter Zustand (ein Event-Loop → keine Locks nötig,
+    solange zwischen Prüfen und Setzen kein await liegt)."""
+    start_index: int = 0
+    total_searches: int = 0
+    pages_done: Dict[int, int] = field(default_factory=dict)  # Suchindex → letzte fertige Seite
+    progress_written: Optional[Tuple] = None
+    progress_time: float = 0.0
+    progress_lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    progress_io: Optional[asyncio.Future] = None  # laufender Schreib-Thread
+    seen_companies: Set[str] = field(default_factory=set)  # company_key()-Werte
+    done: Set[int] = field(default_factory=set)
+    # company_key → (job_count, profile, ts); in scrape() durch ein shelve ersetzt
+    job_count_cache: MutableMapping = field(default_factory=dict)
+    count_memo: Dict[str, Tuple[int, str, float]] = field(default_factory=dict)  # RAM-Spiegel des shelve
+    inflight: Dict[str, asyncio.Future] = field(default_factory=dict)  # laufende Zählungen je Firma
+    cache_unsynced: int = 0
+    write_queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    total_hits: int = 0
+    # Nur was geflusht auf der Platte liegt, kommt in den Checkpoint – sonst
+    # überspränge ein Resume nach hartem Abbruch Firmen, deren Zeilen verloren sind
+    saved_companies: Set[str] = field(default_factory=set)
+    saved_hits: int = 0
+    access_denied_count: int = 0
+    stop_event: asyncio.Event = field(default_factory=asyncio.Event)  # Lead-Limit/Abbruch
 
-    ensure_raw_header()
+    @property
+    def stop(self) -> bool:
+        return self.stop_event.is_set()
 
-    # Progress lesen
-    start_index = 0
-    if os.path.exists(PROGRESS_FILE):
-        try:
-            with open(PROGRESS_FILE, 'r') as f:
-                start_index = int(f.read().strip())
-        except Exception:
-            start_index = 0
-
-    async with async_playwright() as pw:
-        # Browser (kleines Stabilitäts-Flag gegen HTTP/2-Macken)
-        browser = await pw.chromium.launch(
-            headless=True,
-            args=["--no-sandbox", "--disable-http2"]
-        )
-
-        ctx_kwargs = {"ignore_https_errors": True}
-        if PROXY_SERVER:
-            ctx_kwargs["proxy"] = {
-                "server": PROXY_SERVER,
-                **({"username": PROXY_USER} if PROXY_USER else {}),
-                **({"password": PROXY_PASS} if PROXY_PASS else {}),
-            }
-        context = await browser.new_context(**ctx_kwargs)
+async def lookup_job_count(state: ScrapeState, key: str, pool: PagePool, card: Dict) -> Tuple[int, str]:
+    """(job_count, profile) für eine Firma: RAM → shelve → einmalige Zählung.
+    Parallele Anfragen zur selben Firma warten auf dieselbe Zählung (kein Dogpile)."""
+    hit = state.count_memo.get(key)
+    if hit is None:
+        hit = state.job_count_cache.get(key)
+        if hit:
+            state.count_memo[key] = hit
+    if hit and time.time() - hit[2] < (JOB_COUNT_TTL if hit[0] > 0 else NEGATIVE_COUNT_TTL):
+        logger.info(f"♻️ Cache-Treffer für {key}")
+        return hit[0], hit[1]
+
+    fut = state.inflight.get(key)
+    if fut is not None:
+        # shield: bricht ein Wartender ab (Lead-Limit, SIGTERM), bleibt die gemeinsame Zählung intakt
+        return await asyncio.shield(fut)
+
+    fut = asyncio.get_running_loop().create_future()
+    state.inflight[key] = fut
+    try:
+        job_count, profile = await count_company_jobs(pool, card)
+        # Auch echte 0 (keine UID/keine Jobs) merken – sonst navigiert jede Wiederholung
+        # erneut; Zählfehler kommen als Exception und werden nicht gecacht
+        entry = (job_count, profile, time.time())
+        state.count_memo[key] = entry
+        state.job_count_cache[key] = entry
+        state.cache_unsynced += 1
+        if state.cache_unsynced >= CACHE_SYNC_EVERY and hasattr(state.job_count_cache, 'sync'):
+            # Übersteht so auch einen harten Abbruch, nicht nur das reguläre close()
+            state.job_count_cache.sync()
+            state.cache_unsynced = 0
+        if not fut.done():
+            fut.set_result((job_count, profile))
+        return job_count, profile
+    except asyncio.CancelledError:
+        # Wartende bekommen einen normalen Fehler statt selbst abgebrochen zu werden
+        if not fut.done():
+            fut.set_exception(RuntimeError(f"Zählung für {key} abgebrochen"))
+            fut.exception()
+        raise
+    except Exception as e:
+        if not fut.done():
+            fut.set_exception(e)
+            fut.exception()  # als abgerufen markieren, falls niemand wartet
+        raise
+    finally:
+        state.inflight.pop(key, None)
+
+async def unless_stopped(state: ScrapeState, coro):
+    """Führt coro aus, bricht aber ab, sobald das Lead-Limit erreicht wird –
+    laufende Navigationen anderer Karten verschwenden dann keine Zeit mehr.
+    Liefert None bei Abbruch."""
+    if state.stop:
+        coro.close()
+        return None
+    task = asyncio.ensure_future(coro)
+    stopper = asyncio.ensure_future(state.stop_event.wait())
+    try:
+        await asyncio.wait({task, stopper}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        stopper.cancel()
+    if task.done() and not task.cancelled():
+        return task.result()
+    task.cancel()
+    with contextlib.suppress(asyncio.CancelledError, Exception):
+        await task
+    return None
+
+def _write_progress_file(snapshot: Dict):
+    # Atomar ersetzen: ein Abbruch mitten im Schreiben hinterlässt nie eine halbe Datei;
+    # eigener Temp-Name je Schreibvorgang, damit sich zwei Schreiber nie eine Datei teilen
+    fd, tmp = tempfile.mkstemp(dir=OUT_DIR, prefix="progress.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(_dumps(snapshot))
+        os.replace(tmp, PROGRESS_FILE)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp)
+        raise
+
+def read_progress() -> Dict:
+    """Checkpoint: next = niedrigster offener Suchindex, done = außer der Reihe fertige
+    Suchen darüber, pages = letzte fertige Ergebnisseite laufender Suchen,
+    seen = bereits gespeicherte Firmen (company_key), hits = bereits gespeicherte
+    Leads des unterbrochenen Laufs. Alte progress.txt (eine Zahl) bleibt lesbar."""
+    try:
+        with open(PROGRESS_FILE, 'rb') as f:
+            return json.loads(f.read())
+    except Exception:
+        pass
+    try:
+        with open(LEGACY_PROGRESS_FILE, 'r') as f:
+            return {"next": int(f.read().strip())}
+    except Exception:
+        return {}
+
+def clear_progress():
+    """Nach vollständigem Durchlauf: nächster Start beginnt wieder bei Suche 0."""
+    for path in (PROGRESS_FILE, LEGACY_PROGRESS_FILE):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+
+def mark_saved(state: ScrapeState, rows: List[Dict]):
+    """Vom Lead-Writer gemeldet: diese Zeilen liegen geflusht auf der Platte."""
+    state.saved_companies.update(company_key(r["company"]) for r in rows)
+    state.saved_hits += len(rows)
+
+def _log_progress_error(fut: asyncio.Future):
+    # Schreibfehler (z.B. /data voll) loggen statt den ganzen Lauf abzubrechen
+    if not fut.cancelled() and fut.exception() is not None:
+        logger.warning(f"⚠️ Progress konnte nicht gespeichert werden: {fut.exception()}")
+
+async def write_progress(state: ScrapeState, force: bool = False, hits: Optional[int] = None):
+    # Niedrigster noch nicht abgeschlossener Index + außer der Reihe fertige
+    # Suchen darüber + Seitenstand laufender Suchen → Resume wiederholt weder
+    # abgeschlossene Suchen noch bereits abgearbeitete Ergebnisseiten.
+    # Der Lock serialisiert Snapshot + Schreiben, damit nie ein älterer Stand
+    # einen neueren überschreibt.
+    async with state.progress_lock:
+        idx = state.start_index
+        while idx in state.done:
+            idx += 1
+        ahead = sorted(i for i in state.done if i > idx)
+        pages = sorted(state.pages_done.items())
+        hits = state.saved_hits if hits is None else hits
+        signature = (idx, tuple(ahead), tuple(pages), len(state.saved_companies), hits)
+        if signature == state.progress_written:
+            return
+        # Höchstens einmal pro PROGRESS_MIN_INTERVAL schreiben; der letzte Stand folgt mit force=True
+        now = time.monotonic()
+        if not force and now - state.progress_time < PROGRESS_MIN_INTERVAL:
+            return
+        state.progress_written, state.progress_time = signature, now
+        snapshot = {"next": idx, "done": ahead, "pages": {str(i): n for i, n in pages},
+                    "seen": sorted(state.saved_companies), "hits": hits}
+        # Ein abgebrochener Aufrufer lässt seinen Thread weiterschreiben → erst darauf warten
+        if state.progress_io is not None and not state.progress_io.done():
+            await asyncio.wait({state.progress_io})
+        # Dateizugriff im Thread, damit /data (ggf. Netzlaufwerk) den Loop nicht blockiert;
+        # shield: auch bei Abbruch des Aufrufers wird der Snapshot fertig geschrieben
+        state.progress_io = asyncio.ensure_future(asyncio.to_thread(_write_progress_file, snapshot))
+        state.progress_io.add_done_callback(_log_progress_error)
+        with contextlib.suppress(Exception):  # bereits von _log_progress_error geloggt
+            await asyncio.shield(state.progress_io)
+
+async def make_browser(pw):
+    # Ein Browser für den ganzen Lauf (kleines Stabilitäts-Flag gegen HTTP/2-Macken)
+    return await pw.chromium.launch(
+        headless=True,
+        args=["--no-sandbox", "--disable-http2"]
+    )
+
+# Stealth-Skripte einmal bauen; am Context registriert erbt sie jede neue Seite,
+# statt sie per stealth_async() pro Seite erneut zu injizieren.
+_STEALTH_SCRIPTS = list(StealthConfig().enabled_scripts)
+
+async def new_session(browser):
+    """Neuer Context (eigene Cookies/Proxy-Session) samt zwei Suchseiten
+    (aktuelle + vorgeladene nächste Ergebnisseite)."""
+    ctx_kwargs = {"ignore_https_errors": True}
+    if PROXY_SERVER:
+        ctx_kwargs["proxy"] = {
+            "server": PROXY_SERVER,
+            **({"username": PROXY_USER} if PROXY_USER else {}),
+            **({"password": PROXY_PASS} if PROXY_PASS else {}),
+        }
+    if os.path.exists(STATE_FILE):
+        ctx_kwargs["storage_state"] = STATE_FILE
+    context = await browser.new_context(**ctx_kwargs)
+    if "storage_state" in ctx_kwargs:
+        _COOKIES_ACCEPTED.add(context)
+    for script in _STEALTH_SCRIPTS:
+        await context.add_init_script(script)
+    pages = []
+    for _ in range(2):
         page = await context.new_page()
-        await stealth_async(page)
+        await block_resources(page)
+        pages.append(page)
+    pool = PagePool(context, AUX_PAGES)
+    await pool.fill()
+    return context, pages, pool
 
-        for idx, (keyword, location, radius) in enumerate(SEARCH_PARAMS[start_index:], start=start_index):
-            logger.info(f"🚀 Starte Suche {idx+1}/{len(SEARCH_PARAMS)}: {keyword} in {location}")
+def note_access_denied(state: ScrapeState, url: str) -> bool:
+    """Zählt eine Sperre (Suchseite oder Hilfs-Request); True = Limit erreicht, Lauf stoppt."""
+    state.access_denied_count += 1
+    logger.warning(f"⚠️ Access denied auf {url} (insg. {state.access_denied_count})")
+    if state.access_denied_count >= ACCESS_DENIED_LIMIT:
+        if not state.stop:
+            logger.error("❌ Zu viele Access Denied – abbrechen")
+        state.stop_event.set()
+        return True
+    return False
 
-            for page_index in range(1, PAGE_LIMIT + 1):
-                if total_hits >= LEAD_LIMIT:
-                    logger.info(f"🛑 Lead-Limit erreicht ({LEAD_LIMIT}). Stoppe.")
-                    with open(PROGRESS_FILE, 'w') as f: f.write(str(idx))
-                    await browser.close()
-                    return
+def lead_limit_reached(state: ScrapeState) -> bool:
+    if state.total_hits >= LEAD_LIMIT:
+        if not state.stop:
+            logger.info(f"🛑 Lead-Limit erreicht ({LEAD_LIMIT}). Stoppe.")
+        state.stop_event.set()
+    return state.stop
+
+async def process_card(state: ScrapeState, pool: PagePool, keyword: str, location: str, card: Dict):
+    """Eine Jobkarte: Firma zählen und ggf. als Lead speichern.
+    Modulebene + expliziter Zustand statt Closure pro Karte."""
+    title, company = card["title"], card["company"]
+    if not company:
+        return
+
+    logger.info(f"📝 Gefunden: {title} bei {company}")
+    key = company_key(company)
+    if key in state.seen_companies:
+        return
+
+    result = await unless_stopped(state, lookup_job_count(state, key, pool, card))
+    if result is None:
+        return
+    job_count, profile = result
+
+    logger.info(f"🔎 {company}: {job_count} Jobs")
 
-                url = build_search_url(keyword, location, radius, page_index)
-                logger.info(f"🔍 Seite {page_index}: {url}")
+    # Erneut prüfen: ein anderer Worker kann die Firma/das Limit inzwischen erreicht haben
+    if MIN_JOBS <= job_count <= MAX_JOBS and key not in state.seen_companies \
+            and not lead_limit_reached(state):
+        state.seen_companies.add(key)
+        entry = {
+            'keyword': keyword,
+            'location': location,
+            'title': title,
+            'company': company,
+            'jobs': job_count,
+            'profile': profile
+        }
+        await state.write_queue.put(entry)
+        state.total_hits += 1
+        logger.info(f"🚀 Lead {state.total_hits} gespeichert: {company} ({job_count})")
+        # Limit sofort melden → laufende Lookups anderer Karten brechen ab
+        lead_limit_reached(state)
+
+def unique_cards(state: ScrapeState, cards: List[Dict]) -> List[Dict]:
+    """Nur die erste Karte je Firma und keine bereits gespeicherten Firmen –
+    mehrere Anzeigen desselben Arbeitgebers belegen so keine Slots."""
+    here: Set[str] = set()
+    unique = []
+    for card in cards:
+        company = card["company"]
+        if not company:
+            continue
+        key = company_key(company)
+        if key in here or key in state.seen_companies:
+            continue
+        here.add(key)
+        unique.append(card)
+    return unique
+
+async def process_card_bounded(state: ScrapeState, pool: PagePool, keyword: str, location: str,
+                               i: int, card: Dict):
+    async with _CARD_SEM:
+        if lead_limit_reached(state):
+            return
+        try:
+            await process_card(state, pool, keyword, location, card)
+        except Exception as e:
+            logger.error(f"❌ Fehler beim Auslesen Karte {i+1}: {e}")
+
+async def scrape_search(state: ScrapeState, pool: PagePool, pages: List, idx: int, keyword: str,
+                        location: str, urls: List[str]):
+    """Eine (keyword, location)-Suche über alle (vorberechneten) Ergebnisseiten;
+    setzt nach einem Abbruch hinter der letzten vollständig abgearbeiteten Seite fort.
+    Während die Karten von Seite N laufen, lädt die zweite Seite bereits N+1."""
+    first = state.pages_done.get(idx, 0) + 1
+    logger.info(f"🚀 Starte Suche {idx+1}/{state.total_searches}: {keyword} in {location}"
+                + (f" ab Seite {first}" if first > 1 else ""))
+
+    page, spare = pages
+    prefetch: Optional[asyncio.Task] = None
+    try:
+        for page_index, url in enumerate(urls[first - 1:], start=first):
+            if lead_limit_reached(state):
+                return
+
+            logger.info(f"🔍 Seite {page_index}: {url}")
+            try:
+                if prefetch is not None:
+                    resp, prefetch = await prefetch, None
+                else:
+                    if state.access_denied_count:
+                        # Anti-Bot-Signale gesehen → etwas Jitter statt festem Takt
+                        await asyncio.sleep(random.uniform(0, 0.3))
+                    # "commit" liefert den Status sofort → gesperrte Seiten ohne weiteres Warten erkennen
+                    resp = await goto(page, url, wait_until="commit", timeout=30000)
+            except Exception as e:
+                logger.warning(f"⚠️ Fehler bei {url}: {e}")
+                break
+
+            denied = is_denied_response(resp)
+            count = 0
+            if not denied:
                 try:
-                    await page.goto(url, wait_until="domcontentloaded", timeout=30000)
+                    # Erst vollständig geparst (sonst halbe Kartenliste), dann nur kurz auf
+                    # nachgeladene Karten warten – leere Seiten kosten so kaum Zeit
+                    await page.wait_for_load_state("domcontentloaded", timeout=30000)
+                    with contextlib.suppress(PlaywrightTimeoutError):
+                        await page.wait_for_selector(_SEARCH_READY_SEL, state="attached", timeout=2000)
                     await accept_all_cookies(page)
+                    # Alle Kartenfelder in einem einzigen CDP-Aufruf statt ~6 Round-Trips pro Karte
+                    cards = await page.eval_on_selector_all("article[data-at='job-item']", _CARDS_JS)
+                    count = len(cards)
+                    # Status ist maßgeblich; Body nur ohne Response (z.B. SPA-Navigation) prüfen
+                    if count == 0 and resp is None:
+                        denied = await is_access_denied(page)
                 except Exception as e:
                     logger.warning(f"⚠️ Fehler bei {url}: {e}")
                     break
 
-                if await is_access_denied(page):
-                    access_denied_count += 1
-                    logger.warning(f"⚠️ Access denied auf {url} (insg. {access_denied_count})")
-                    if access_denied_count >= ACCESS_DENIED_LIMIT:
-                        logger.error("❌ Zu viele Access Denied – abbrechen")
-                        with open(PROGRESS_FILE, 'w') as f: f.write(str(idx))
-                        await browser.close()
-                        return
-                    await asyncio.sleep(5)
-                    continue
+            if denied:
+                if note_access_denied(state, url):
+                    return
+                await asyncio.sleep(5)
+                continue
 
-                cards = page.locator("article[data-at='job-item']")
-                count = await cards.count()
-                logger.info(f"📦 Gefundene Jobkarten: {count}")
-                if count == 0:
-                    break
+            logger.info(f"📦 Gefundene Jobkarten: {count}")
+            if count == 0:
+                break
 
-                for i in range(count):
-                    if total_hits >= LEAD_LIMIT:
-                        logger.info(f"🛑 Lead-Limit erreicht ({LEAD_LIMIT}). Stoppe.")
-                        with open(PROGRESS_FILE, 'w') as f: f.write(str(idx))
-                        await browser.close()
-                        return
+            # Nächste Ergebnisseite schon laden, während die Karten dieser Seite laufen
+            if page_index < len(urls):
+                prefetch = asyncio.create_task(
+                    goto(spare, urls[page_index], wait_until="commit", timeout=30000))
 
-                    try:
-                        card = cards.nth(i)
-
-                        # === Titel & Firma (wie Overnight) – mit sanftem Fallback ===
-                        title_loc = card.locator("[data-testid='job-item-title'] div.res-ewgtgq")
-                        if await title_loc.count() == 0:
-                            title_loc = card.locator("[data-testid='job-item-title'] div").first
-                        title = (await title_loc.inner_text()).strip()
-
-                        company_loc = card.locator("span[data-at='job-item-company-name'] span.res-du9bhi")
-                        if await company_loc.count() == 0:
-                            company_loc = card.locator("span[data-at='job-item-company-name'] span").first
-                        company = (await company_loc.inner_text()).strip()
-
-                        logger.info(f"📝 Gefunden: {title} bei {company}")
-                        if company in seen_companies:
-                            continue
-
-                        # Primär: Firmenprofil (Logo-Link) → zählen
-                        profile_url = None
-                        logo = card.locator("a[data-at='company-logo']").first
-                        if await logo.count():
-                            href = await logo.get_attribute("href")
-                            if href:
-                                profile_url = href if href.startswith("http") else f"https://www.stepstone.de{href}"
-
-                        job_count = 0
-                        if profile_url:
-                            try:
-                                job_count = await count_on_profile(context, profile_url)
-                            except Exception as e:
-                                logger.debug(f"Profilzählung fehlgeschlagen: {e}")
-
-                        # Fallback: companyUid (aus Karte oder Detailseite) → /jobs/?companyUid=...
-                        current_uid: Optional[str] = None
-                        if job_count == 0:
-                            # a) direkt aus Karte (Namenslink mit companyUid)
-                            name_link = card.locator("[data-at='job-item-company-name'] a[href*='companyUid=']").first
-                            if await name_link.count():
-                                href = await name_link.get_attribute("href") or ""
-                                m = re.search(r'companyUid=([0-9a-fA-F\-]{16,})', href)
-                                if m:
-                                    current_uid = m.group(1)
-
-                            # b) sonst Jobdetailseite kurz öffnen und UID parsen
-                            if not current_uid:
-                                job_a = card.locator("[data-testid='job-item-title'] a").first
-                                if await job_a.count():
-                                    href = await job_a.get_attribute("href")
-                                    if href:
-                                        job_url = href if href.startswith("http") else f"https://www.stepstone.de{href}"
-                                        d = await context.new_page(); await stealth_async(d)
-                                        try:
-                                            await d.goto(job_url, wait_until="domcontentloaded", timeout=20000)
-                                            await accept_all_cookies(d)
-                                            html = await d.content()
-                                            current_uid = extract_company_uid_from_html(html)
-                                        except Exception:
-                                            pass
-                                        finally:
-                                            await d.close()
-
-                            if current_uid:
-                                job_count = await count_on_companyuid(context, current_uid)
-                                if job_count > 0:
-                                    logger.info(f"🔗 Fallback via companyUid ok ({current_uid})")
-
-                        logger.info(f"🔎 {company}: {job_count} Jobs")
-
-                        if MIN_JOBS <= job_count <= MAX_JOBS:
-                            seen_companies.add(company)
-                            entry = {
-                                'keyword': keyword,
-                                'location': location,
-                                'title': title,
-                                'company': company,
-                                'jobs': job_count,
-                                'profile': profile_url or (f"https://www.stepstone.de/jobs/?companyUid={current_uid}" if current_uid else "")
-                            }
-                            raw_leads.append(entry)
-                            append_raw_row(entry)
-                            total_hits += 1
-                            logger.info(f"🚀 Lead {total_hits} gespeichert: {company} ({job_count})")
-
-                    except Exception as e:
-                        logger.error(f"❌ Fehler beim Auslesen Karte {i+1}: {e}")
-                        continue
-
-            with open(PROGRESS_FILE, 'w') as f:
-                f.write(str(idx+1))
-
-        await browser.close()
-
-    # Dedupe & Save
-    unique = {(r['company'], r['profile']): r for r in raw_leads}
-    leads = list(unique.values())
-    keys = ['keyword','location','title','company','jobs','profile']
-
-    with open(RAW_CSV, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=keys)
-        writer.writeheader()
-        writer.writerows(raw_leads)
-    logger.info(f"💾 Rohdaten → {RAW_CSV}")
-
-    with open(FINAL_CSV, 'w', newline='', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fieldnames=keys)
-        writer.writeheader()
-        writer.writerows(leads)
-    logger.info(f"🎉 Fertig: {len(leads)} eindeutige Leads → {FINAL_CSV}")
+            # Karten einer Seite überlappend abarbeiten (Netzlatenz dominiert)
+            await asyncio.gather(*(process_card_bounded(state, pool, keyword, location, i, card)
+                                   for i, card in enumerate(unique_cards(state, cards))))
+            if state.stop:
+                # Seite evtl. unvollständig – gespeicherte Firmen stehen aber in seen
+                return
+            state.pages_done[idx] = page_index
+            await write_progress(state)
+            page, spare = spare, page
+    finally:
+        if prefetch is not None:
+            prefetch.cancel()
+
+async def search_worker(browser, state: ScrapeState, queue: asyncio.Queue, wid: int):
+    """Eigener Context je Worker im gemeinsamen Browser (bei Proxy-Rotation = eigene Session)."""
+    context, pages, pool = await new_session(browser)
+    pool.on_denied = lambda url: note_access_denied(state, url)
+    try:
+        while not state.stop:
+            try:
+                idx, (keyword, location, _radius, urls) = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            await scrape_search(state, pool, pages, idx, keyword, location, urls)
+            if state.stop:
+                # Suche unvollständig → beim Resume erneut starten
+                break
+            state.done.add(idx)
+            state.pages_done.pop(idx, None)
+            await write_progress(state)
+    finally:
+        await context.close()
+    logger.info(f"🏁 Worker {wid} beendet")
+
+async def scrape(params: Optional[List[Tuple[str, str, int]]] = None, workers: int = WORKERS):
+    """Einstiegspunkt; Varianten rufen scrape(params=..., workers=...) statt den Code zu kopieren."""
+    setup_logging()
+    jobs = SEARCH_JOBS if params is None else build_search_jobs(params)
+    state = ScrapeState(total_searches=len(jobs))
+
+    open_lead_sinks()
+
+    # Progress lesen
+    progress = read_progress()
+    state.start_index = int(progress.get("next", 0))
+    state.done.update(progress.get("done", ()))
+    state.pages_done.update((int(i), n) for i, n in progress.get("pages", {}).items())
+    state.seen_companies.update(progress.get("seen", ()))
+    state.saved_companies.update(state.seen_companies)
+    # Unterbrochener Lauf + Resume teilen sich ein LEAD_LIMIT
+    state.total_hits = state.saved_hits = int(progress.get("hits", 0))
+
+    queue: asyncio.Queue = asyncio.Queue()
+    for idx in range(state.start_index, len(jobs)):
+        if idx not in state.done:
+            queue.put_nowait((idx, jobs[idx]))
+
+    # SIGTERM wie Strg+C: scrape() abbrechen → finally schließt shelve, CSVs und Progress sauber
+    loop = asyncio.get_running_loop()
+    with contextlib.suppress(NotImplementedError):  # Windows: keine Loop-Signalhandler
+        loop.add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+
+    state.job_count_cache = shelve.open(JOB_COUNT_DB, writeback=False)
+    writer = asyncio.create_task(lead_writer_task(state.write_queue, lambda rows: mark_saved(state, rows)))
+    completed = False
+    try:
+        async with async_playwright() as pw:
+            browser = await make_browser(pw)
+            try:
+                await asyncio.gather(*(search_worker(browser, state, queue, wid) for wid in range(workers)))
+            finally:
+                await browser.close()
+        completed = True
+    finally:
+        # Writer per None beenden; was ein abgestürzter Writer liegen ließ, direkt schreiben
+        state.write_queue.put_nowait(None)
+        await asyncio.gather(writer, return_exceptions=True)
+        mark_saved(state, drain_lead_queue(state.write_queue))
+        close_lead_sinks()
+        state.job_count_cache.close()
+        if completed and not state.stop:
+            # Alle Suchen durch → kein Resume nötig
+            clear_progress()
+        elif completed and state.total_hits >= LEAD_LIMIT:
+            # Regulär am Lead-Limit beendet: Position/seen behalten, der nächste Lauf
+            # bekommt aber wieder das volle LEAD_LIMIT
+            await write_progress(state, force=True, hits=0)
+        else:
+            # Abbruch/Fehler/Access Denied: kompletter Stand inkl. hits für das Resume
+            await write_progress(state, force=True)
+        with contextlib.suppress(NotImplementedError):
+            loop.remove_signal_handler(signal.SIGTERM)
+
+    logger.info(f"💾 Rohdaten → {RAW_JSONL}")
+    logger.info(f"🎉 Fertig: {state.total_hits} eindeutige Leads → {FINAL_CSV}")
 
 if __name__ == '__main__':
     try:
         asyncio.run(scrape())
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         logger.warning("⚠️ Abbruch durch Benutzer")
         sys.exit(1)